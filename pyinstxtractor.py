@@ -1,19 +1,43 @@
 import argparse
+import io
 import logging
 import marshal
+import mmap
 import os
 import struct
-import zlib
-from collections import namedtuple
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from importlib.util import MAGIC_NUMBER
 from uuid import uuid4 as unique_name
 
+try:
+    from isal import isal_zlib as zlib  # ISA-L is a faster drop-in replacement for zlib
+except ImportError:
+    import zlib
+
+try:
+    import rapidgzip  # Decompresses a single big DEFLATE stream on all cores
+except ImportError:
+    rapidgzip = None
+
 PYC_MAGIC = {(1, 5): 20121, (1, 6): 50428, (2, 0): 50823, (2, 1): 60202, (2, 2): 60717, (2, 3): 62021, (2, 4): 62061,
              (2, 5): 62131, (2, 6): 62161, (2, 7): 62211, (3, 0): 3131, (3, 1): 3151, (3, 2): 3180, (3, 3): 3230,
              (3, 4): 3310, (3, 5): 3351, (3, 6): 3379, (3, 7): 3394, (3, 8): 3413, (3, 9): 3425, (3, 10): 3439}
 PYINST20_COOKIE_SIZE = 24           # For pyinstaller 2.0
 PYINST21_COOKIE_SIZE = 24 + 64      # For pyinstaller 2.1+
 MAGIC = b'MEI\014\013\012\013\016'  # Magic number which identifies pyinstaller
+CTOC_ENTRY_HEADER = struct.Struct('!iiiiBc')  # Fixed size part of a TOC entry, followed by the name
+MAX_WORKERS = os.cpu_count() or 1
+PENDING_WINDOW = 2 * MAX_WORKERS  # Results kept in flight ahead of the main thread
+PYC_ENTRY_TYPES = (b's', b'M', b'm')  # Entries written out as pyc files
+STREAM_THRESHOLD = 4 * 1024 * 1024  # Entries bigger than this are decompressed in chunks
+STREAM_CHUNK_SIZE = 1024 * 1024
+MAX_DEFLATE_RATIO = 1032  # Upper bound of DEFLATE expansion, caps preallocation for tampered sizes
+PARALLEL_DECOMPRESS_THRESHOLD = 64 * 1024 * 1024  # Compressed entries bigger than this go through rapidgzip
+WRITE_BUFFER_SIZE = 1024 * 1024  # Small entries are flushed in a single write
+BYTES_SEP = os.fsencode(os.path.sep)  # CArchive names are kept as bytes paths
+MODULE_PATH_TABLE = str.maketrans({'.': os.path.sep})  # Dotted module name to relative path
 
 CTOCEntry = namedtuple('CTOCEntry', ['position',
                                      'compressed_data_size',
@@ -35,6 +59,7 @@ class PyInstArchive:
         self.extraction_dir = output_path
         self.target_file_path = target_path
         self.target_fp = None
+        self.target_mm = None
         self.target_file_size = None
         self.cookie_pos = None
         self.pyinstaller_ver = None
@@ -44,12 +69,15 @@ class PyInstArchive:
         self.contents_table_size = None
         self.toc_list = list()
         self.py_ver = None
+        self.pyc_header = None
         self.extract_pyz = extract_pyz
 
     def open(self):
         try:
             self.target_fp = open(self.target_file_path, 'rb')
             self.target_file_size = os.stat(self.target_file_path).st_size
+            if self.target_file_size > 0:  # An empty file can not be mapped, check_file reports it
+                self.target_mm = mmap.mmap(self.target_fp.fileno(), 0, access=mmap.ACCESS_READ)
         except Exception as e:
             logger.warning(f'Could not open {self.target_file_path}, {e}')
             if self.target_fp:
@@ -58,40 +86,25 @@ class PyInstArchive:
         return True
 
     def close(self):
+        if self.target_mm is not None:
+            self.target_mm.close()
         self.target_fp.close()
 
     def check_file(self):
         logger.info('Processing {0}'.format(self.target_file_path))
-        search_chunk_size = 0x2000
-        end_pos = self.target_file_size
-        self.cookie_pos = -1
-
-        if end_pos < len(MAGIC):
+        if self.target_file_size < len(MAGIC):
             logger.warning('File is too short or truncated')
             return False
 
-        while True:
-            start_pos = end_pos - search_chunk_size if end_pos >= search_chunk_size else 0
-            chunk_size = end_pos - start_pos
-            if chunk_size < len(MAGIC):
-                break
-            self.target_fp.seek(start_pos, os.SEEK_SET)
-            data = self.target_fp.read(chunk_size)
-            offs = data.rfind(MAGIC)
-            if offs != -1:
-                self.cookie_pos = start_pos + offs
-                break
-            end_pos = start_pos + len(MAGIC) - 1
-            if start_pos == 0:
-                break
+        self.cookie_pos = self.target_mm.rfind(MAGIC)
 
         if self.cookie_pos == -1:
             logger.warning('Missing cookie, unsupported pyinstaller version or not a pyinstaller archive')
             return False
 
-        self.target_fp.seek(self.cookie_pos + PYINST20_COOKIE_SIZE, os.SEEK_SET)
-
-        if b'python' in self.target_fp.read(64):
+        # pyinstaller 2.1+ appends the python library name to the cookie
+        probe_pos = self.cookie_pos + PYINST20_COOKIE_SIZE
+        if self.target_mm.find(b'python', probe_pos, probe_pos + 64) != -1:
             logger.info('Pyinstaller version: 2.1+')
             self.pyinstaller_ver = 21  # pyinstaller 2.1+
         else:
@@ -101,13 +114,12 @@ class PyInstArchive:
 
     def get_compress_archive_info(self):
         try:
-            self.target_fp.seek(self.cookie_pos, os.SEEK_SET)
             if self.pyinstaller_ver == 20:
                 magic, length_of_package, toc, toc_len, self.py_ver = \
-                    struct.unpack('!8siiii', self.target_fp.read(PYINST20_COOKIE_SIZE))
+                    struct.unpack_from('!8siiii', self.target_mm, self.cookie_pos)
             elif self.pyinstaller_ver == 21:
                 magic, length_of_package, toc, toc_len, self.py_ver, py_libname = \
-                    struct.unpack('!8siiii64s', self.target_fp.read(PYINST21_COOKIE_SIZE))
+                    struct.unpack_from('!8siiii64s', self.target_mm, self.cookie_pos)
                 logger.debug(f'py_libname: {py_libname}')
             else:
                 raise Exception(f'Can not match pyinstaller version {self.pyinstaller_ver}')
@@ -116,6 +128,11 @@ class PyInstArchive:
             return False
 
         logger.info('Python version: {0}'.format(self.py_ver))
+        try:
+            self.pyc_header = self._build_pyc_header(self.py_ver)
+        except KeyError:
+            logger.warning(f'Unknown pyc magic for Python version {self.py_ver}')
+            return False
         # Additional data after the cookie
         tail_bytes = self.target_file_size - self.cookie_pos - (
             PYINST20_COOKIE_SIZE if self.pyinstaller_ver == 20 else PYINST21_COOKIE_SIZE)
@@ -128,26 +145,33 @@ class PyInstArchive:
         return True
 
     def parse_toc(self):
+        # Bind everything the loop touches to locals, archives can have tens of thousands of entries
+        target_mm = self.target_mm
+        unpack_header = CTOC_ENTRY_HEADER.unpack_from
+        header_size = CTOC_ENTRY_HEADER.size
+        overlay_pos = self.overlay_pos
+        add_entry = self.toc_list.append
         # Go to the table of contents
-        self.target_fp.seek(self.contents_table_pos, os.SEEK_SET)
-        parsed_len = 0
+        entry_start = self.contents_table_pos
+        toc_end = self.contents_table_pos + self.contents_table_size
         # Parse table of contents
-        while parsed_len < self.contents_table_size:
-            entry_size, = struct.unpack('!i', self.target_fp.read(4))
-            name_len = struct.calcsize('!iiiiBc')
-            entry_pos, cmprsd_data_size, uncmprsd_data_size, cmprs_flag, type_cmprs_data, name = \
-                struct.unpack(
-                    '!iiiBc{0}s'.format(entry_size - name_len),
-                    self.target_fp.read(entry_size - 4))
-
-            name = name.decode('utf-8').rstrip('\0')
+        while entry_start < toc_end:
+            entry_size, entry_pos, cmprsd_data_size, uncmprsd_data_size, cmprs_flag, type_cmprs_data = \
+                unpack_header(target_mm, entry_start)
+            if entry_size < header_size:
+                logger.warning(f'Invalid TOC entry size {entry_size}, stop parsing table of contents')
+                break
+            name = target_mm[entry_start + header_size:entry_start + entry_size]
+
+            # Names stay bytes, the OS layer takes them as paths without a decode/encode round-trip
+            name = name.rstrip(b'\0')
             if len(name) == 0:
-                name = str(unique_name())
-                logger.warning(f'Found an unnamed file in CArchive. Using random name {name}')
+                name = str(unique_name()).encode()
+                logger.warning(f'Found an unnamed file in CArchive. Using random name {os.fsdecode(name)}')
 
-            self.toc_list.append(
+            add_entry(
                 CTOCEntry(
-                    self.overlay_pos + entry_pos,
+                    overlay_pos + entry_pos,
                     cmprsd_data_size,
                     uncmprsd_data_size,
                     cmprs_flag,
@@ -155,77 +179,237 @@ class PyInstArchive:
                     name
                 ))
 
-            parsed_len += entry_size
+            entry_start += entry_size
         logger.info(f'Found {len(self.toc_list)} files in CArchive')
 
-    def _write_raw_data(self, filepath, data):
-        nm = filepath.replace('\\', os.path.sep).replace('/', os.path.sep).replace('..', '__')
-        nm_dir = os.path.dirname(nm)
-        if nm_dir != '' and not os.path.exists(nm_dir):  # Check if target_path exists, create if not
-            os.makedirs(nm_dir)
-        with open(nm, 'wb') as f:
-            f.write(data)
+    def _entry_path(self, entry):
+        if entry.type_compressed_data in PYC_ENTRY_TYPES:
+            file_name = entry.name + b'.pyc'
+        else:
+            file_name = entry.name.replace(b'\\', BYTES_SEP).replace(b'/', BYTES_SEP).replace(b'..', b'__')
+        # Join with the output directory instead of changing the process wide working directory
+        return os.path.join(os.fsencode(self.extraction_dir), file_name)
+
+    @staticmethod
+    def _make_dirs(paths):
+        # Entries commonly share their parent, create each directory once
+        for dir_name in sorted({os.path.dirname(path) for path in paths}):
+            if dir_name:
+                os.makedirs(dir_name, exist_ok=True)
+
+    @staticmethod
+    def _preallocate(f, size):
+        # Reserve the extents of a big output in one call instead of growing the file on every write
+        if hasattr(os, 'posix_fallocate') and size > 0:
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+            except OSError:
+                pass  # Not supported by every filesystem
+
+    def _write_raw_data(self, filepath, chunks, size_hint=None):
+        with open(filepath, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+            if size_hint is None:
+                f.writelines(chunks)
+                return
+            self._preallocate(f, size_hint)
+            try:
+                f.writelines(chunks)
+            finally:
+                f.truncate()  # The size comes from the archive and may not match the data
+
+    def _copy_raw_data(self, filepath, entry):
+        with open(filepath, 'wb') as f:
+            offset = entry.position
+            count = entry.compressed_data_size
+            if hasattr(os, 'sendfile'):
+                # Copy in kernel space without going through a Python buffer
+                try:
+                    while count > 0:
+                        sent = os.sendfile(f.fileno(), self.target_fp.fileno(), offset, count)
+                        if sent == 0:
+                            break
+                        offset += sent
+                        count -= sent
+                except OSError:
+                    pass  # Some platforms only support sockets as output, copy the rest from the mapping
+            while count > 0:
+                chunk = self.target_mm[offset:offset + min(count, STREAM_CHUNK_SIZE)]
+                if not chunk:
+                    break
+                f.write(chunk)
+                offset += len(chunk)
+                count -= len(chunk)
 
     def extract_files(self):
         logger.info('Beginning extraction...please standby')
         if not os.path.exists(self.extraction_dir):
             os.mkdir(self.extraction_dir)
+        entry_paths = [self._entry_path(entry) for entry in self.toc_list]
+        self._make_dirs(entry_paths)
+
+        # Workers write their own output, entries sharing a path would write it concurrently.
+        # Keep only the last one, which is what a serial extraction leaves on disk.
+        last_index = {os.path.normcase(path): index for index, path in enumerate(entry_paths)}
+        entries = []
+        for index, (entry, path) in enumerate(zip(self.toc_list, entry_paths)):
+            if last_index[os.path.normcase(path)] == index:
+                entries.append(entry)
+            else:
+                logger.warning(f'Skipping {os.fsdecode(entry.name)}, its output is overwritten by a later entry')
+
+        # The archive is mapped so there is no shared file pointer, zlib releases the GIL so decompress in threads
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for entry, data in self._map_in_window(executor, self._read_entry, entries):
+                if data is not None:
+                    self._write_entry(entry, data)
+                self._finish_entry(entry)
+
+    @staticmethod
+    def _map_in_window(executor, fn, items):
+        # Like executor.map, but only submits a bounded window so finished results do not pile up in memory
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(fn, item)))
+            if len(pending) >= PENDING_WINDOW:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+    @staticmethod
+    def _is_streamed(entry):
+        return entry.compress_flag == 1 and entry.uncompressed_data_size > STREAM_THRESHOLD
+
+    def _read_entry(self, entry):
+        # Returns the data left for the main thread to write, or None if the entry is already written
+        if self._is_streamed(entry):
+            # Big entries dominate extraction time, decompress and write them here to bound memory usage
+            try:
+                self._write_entry(entry, self._stream_entry(entry))
+            except Exception:
+                # Do not leave a partially written file behind, extract_files made this entry its only writer
+                file_path = self._entry_path(entry)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                raise
+            return None
+        if entry.compress_flag == 0 and entry.type_compressed_data not in PYC_ENTRY_TYPES:
+            # Raw data is copied straight from the archive
+            self._copy_raw_data(self._entry_path(entry), entry)
+            return None
+
+        data = self.target_mm[entry.position:entry.position + entry.compressed_data_size]
+        if entry.compress_flag == 1:
+            data = zlib.decompress(data)
+            # Malware may tamper with the uncompressed size
+            # Comment out the assertion in such a case
+            assert len(data) == entry.uncompressed_data_size  # Sanity Check
+        return [data]
+
+    def _stream_entry(self, entry):
+        if rapidgzip is not None and entry.compressed_data_size > PARALLEL_DECOMPRESS_THRESHOLD:
+            chunks = self._decompress_parallel(entry)
+        else:
+            chunks = self._decompress_chunked(entry)
+        total_size = 0
+        for data in chunks:
+            total_size += len(data)
+            yield data
+        # Malware may tamper with the uncompressed size
+        # Comment out the assertion in such a case
+        assert total_size == entry.uncompressed_data_size  # Sanity Check
+
+    def _decompress_chunked(self, entry):
+        decompressor = zlib.decompressobj()
+        pos = entry.position
+        end_pos = entry.position + entry.compressed_data_size
+        while pos < end_pos:
+            chunk = self.target_mm[pos:min(pos + STREAM_CHUNK_SIZE, end_pos)]
+            pos += len(chunk)
+            while chunk:
+                yield decompressor.decompress(chunk, STREAM_CHUNK_SIZE)
+                chunk = decompressor.unconsumed_tail
+        yield decompressor.flush()
+
+    def _decompress_parallel(self, entry):
+        data = io.BytesIO(self.target_mm[entry.position:entry.position + entry.compressed_data_size])
+        f = None
+        try:
+            f = rapidgzip.RapidgzipFile(data, parallelization=MAX_WORKERS)
+            chunk = f.read(STREAM_CHUNK_SIZE)
+        except Exception as e:
+            # rapidgzip before 0.12.1 only detects gzip, nothing is written yet so fall back to zlib
+            if f is not None:
+                f.close()
+            logger.warning(f'rapidgzip can not decompress {os.fsdecode(entry.name)}, falling back to zlib. {e}')
+            yield from self._decompress_chunked(entry)
+            return
+        with f:
+            while chunk:
+                yield chunk
+                chunk = f.read(STREAM_CHUNK_SIZE)
+
+    def _write_entry(self, entry, chunks):
+        file_path = self._entry_path(entry)
+        size_hint = None
+        if self._is_streamed(entry):
+            size_hint = min(entry.uncompressed_data_size, entry.compressed_data_size * MAX_DEFLATE_RATIO)
+
+        if entry.type_compressed_data in PYC_ENTRY_TYPES:
+            # s -> ARCHIVE_ITEM_PYSOURCE, entry points
+            # M -> ARCHIVE_ITEM_PYPACKAGE
+            # m -> ARCHIVE_ITEM_PYMODULE
+            # all of them are marshalled code objects written out as pyc files
+            self._write_pyc(file_path, chunks, size_hint)
 
-        os.chdir(self.extraction_dir)
-
-        for entry in self.toc_list:
-            base_path = os.path.dirname(entry.name)
-            if base_path != '':
-                # Check if target_path exists, create if not
-                if not os.path.exists(base_path):
-                    os.makedirs(base_path)
-
-            self.target_fp.seek(entry.position, os.SEEK_SET)
-            data = self.target_fp.read(entry.compressed_data_size)
-
-            if entry.compress_flag == 1:
-                data = zlib.decompress(data)
-                # Malware may tamper with the uncompressed size
-                # Comment out the assertion in such a case
-                assert len(data) == entry.uncompressed_data_size  # Sanity Check
-
-            if entry.type_compressed_data == b's':
-                # s -> ARCHIVE_ITEM_PYSOURCE
-                # Entry point are expected to be python scripts
-                logger.info('Possible entry point: {0}.pyc'.format(entry.name))
-                self._write_pyc(entry.name + '.pyc', data)
-
-            elif entry.type_compressed_data == b'M' or entry.type_compressed_data == b'm':
-                # M -> ARCHIVE_ITEM_PYPACKAGE
-                # m -> ARCHIVE_ITEM_PYMODULE
-                # packages and modules are pyc files with their header's intact
-                self._write_pyc(entry.name + '.pyc', data)
-
+        else:
+            self._write_raw_data(file_path, chunks, size_hint)
+
+    def _finish_entry(self, entry):
+        # Runs on the main thread in TOC order once the entry is written
+        if entry.type_compressed_data == b's':
+            # Entry point are expected to be python scripts
+            logger.info('Possible entry point: {0}.pyc'.format(os.fsdecode(entry.name)))
+
+        elif self.extract_pyz and (entry.type_compressed_data == b'z' or entry.type_compressed_data == b'Z'):
+            file_path = self._entry_path(entry)
+            with open(file_path, 'rb') as f:
+                pyz_magic = f.read(4)
+                assert pyz_magic == b'PYZ\0'
+                pyc_magic = f.read(4)
+            if pyc_magic == MAGIC_NUMBER:
+                self._extract_pyz(os.fsdecode(file_path))
             else:
-                self._write_raw_data(entry.name, data)
-                if self.extract_pyz and (entry.type_compressed_data == b'z' or entry.type_compressed_data == b'Z'):
-                    with open(entry.name, 'rb') as f:
-                        pyz_magic = f.read(4)
-                        assert pyz_magic == b'PYZ\0'
-                        pyc_magic = f.read(4)
-                    if pyc_magic == MAGIC_NUMBER:
-                        self._extract_pyz(entry.name)
-                    else:
-                        logger.warning('extract pyz must use same Python version!')
+                logger.warning('extract pyz must use same Python version!')
 
-    def _write_pyc(self, filename, data):
-        with open(filename, 'wb') as pyc_file:
-            pyc_magic = PYC_MAGIC[(int(str(self.py_ver)[0]), int(str(self.py_ver)[1:]))]
-            pyc_file.write(struct.pack("<H", pyc_magic) + b'\x0d\x0a')  # pyc magic
-            if self.py_ver >= 37:  # PEP 552 -- Deterministic pycs
-                pyc_file.write(b'\0' * 4)  # Bitfield
-                pyc_file.write(b'\0' * 8)  # (Timestamp + size) || hash
+    def _write_pyc(self, filename, chunks, size_hint=None):
+        with open(filename, 'wb', buffering=WRITE_BUFFER_SIZE) as pyc_file:
+            if size_hint is None:
+                pyc_file.write(self.pyc_header)
+                pyc_file.writelines(chunks)
+                return
+            self._preallocate(pyc_file, len(self.pyc_header) + size_hint)
+            try:
+                pyc_file.write(self.pyc_header)
+                pyc_file.writelines(chunks)
+            finally:
+                pyc_file.truncate()  # The size comes from the archive and may not match the data
+
+    @staticmethod
+    def _build_pyc_header(py_ver):
+        # py_ver is major * 10 + minor in older pyinstaller, major * 100 + minor since 3.10 support
+        version = divmod(py_ver, 100) if py_ver >= 100 else divmod(py_ver, 10)
+        pyc_header = struct.pack("<H", PYC_MAGIC[version]) + b'\x0d\x0a'  # pyc magic
+        if version >= (3, 7):  # PEP 552 -- Deterministic pycs
+            pyc_header += b'\0' * 4  # Bitfield
+            pyc_header += b'\0' * 8  # (Timestamp + size) || hash
 
-            else:
-                pyc_file.write(b'\0' * 4)  # Timestamp
-                if self.py_ver >= 33:
-                    pyc_file.write(b'\0' * 4)  # Size parameter added in Python 3.3
-            pyc_file.write(data)
+        else:
+            pyc_header += b'\0' * 4  # Timestamp
+            if version >= (3, 3):
+                pyc_header += b'\0' * 4  # Size parameter added in Python 3.3
+        return pyc_header
 
     def _extract_pyz(self, name):
         dir_name = name + '_extracted'
@@ -233,12 +417,10 @@ class PyInstArchive:
         if not os.path.exists(dir_name):
             os.mkdir(dir_name)
 
-        with open(name, 'rb') as f:
-            f.seek(8, os.SEEK_SET)
-            toc_position, = struct.unpack('!i', f.read(4))
-            f.seek(toc_position, os.SEEK_SET)
+        with open(name, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as pyz_mm:
+            toc_position, = struct.unpack_from('!i', pyz_mm, 8)
             try:
-                toc = marshal.load(f)
+                toc = marshal.loads(pyz_mm[toc_position:])
             except Exception as e:
                 logger.warning(f'Unmarshalling FAILED. Cannot extract {name}. Extracting remaining files. {e}')
                 return
@@ -246,12 +428,11 @@ class PyInstArchive:
             logger.info(f'Found {len(toc)} files in PYZ archive')
 
             # From pyinstaller 3.1+ toc is a list of tuples
-            if type(toc) == list:
+            if isinstance(toc, list):
                 toc = dict(toc)
 
-            for key in toc.keys():
-                (ispkg, pos, length) = toc[key]
-                f.seek(pos, os.SEEK_SET)
+            pyz_entries = []
+            for key, (ispkg, pos, length) in toc.items():
                 file_name = key
                 try:
                     # for Python > 3.3 some keys are bytes object some are str object
@@ -259,22 +440,33 @@ class PyInstArchive:
                 except:
                     pass
                 # Prevent writing outside dirName
-                file_name = file_name.replace('..', '__').replace('.', os.path.sep)
+                file_name = file_name.replace('..', '__').translate(MODULE_PATH_TABLE)
                 if ispkg == 1:
                     file_path = os.path.join(dir_name, file_name, '__init__.pyc')
                 else:
                     file_path = os.path.join(dir_name, file_name + '.pyc')
-                file_dir = os.path.dirname(file_path)
-                if not os.path.exists(file_dir):
-                    os.makedirs(file_dir)
-                try:
-                    data = f.read(length)
-                    data = zlib.decompress(data)
-                except Exception as e:
-                    logger.warning(f'Failed to decompress {file_path}, probably encrypted. {e}.')
-                    open(file_path + '.encrypted', 'wb').write(data)
-                else:
-                    self._write_pyc(file_path, data)
+                pyz_entries.append((file_path, pos, length))
+            self._make_dirs(file_path for file_path, pos, length in pyz_entries)
+
+            # Modules are small and independent, decompress them in threads like the CArchive entries
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                entries_data = self._map_in_window(executor, partial(self._read_pyz_entry, pyz_mm), pyz_entries)
+                for (file_path, pos, length), (data, error) in entries_data:
+                    if error is not None:
+                        logger.warning(f'Failed to decompress {file_path}, probably encrypted. {error}.')
+                        with open(file_path + '.encrypted', 'wb') as encrypted_file:
+                            encrypted_file.write(data)
+                    else:
+                        self._write_pyc(file_path, [data])
+
+    @staticmethod
+    def _read_pyz_entry(pyz_mm, pyz_entry):
+        file_path, pos, length = pyz_entry
+        data = pyz_mm[pos:pos + length]
+        try:
+            return zlib.decompress(data), None
+        except Exception as e:
+            return data, e
 
 
 def main():